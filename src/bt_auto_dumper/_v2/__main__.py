@@ -1,23 +1,56 @@
 import argparse
 import configparser
+import functools
+import hashlib
 import json
 import logging
 import os
 import pathlib
+import shutil
 import subprocess
+import tempfile
 import time
 import zipfile
-from io import BufferedReader
+from collections.abc import Collection
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import IO
 
 import bittensor as bt  # type: ignore
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter, Retry
+from requests_toolbelt import MultipartEncoder  # type: ignore
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+_APIVER = pathlib.Path(__file__).parent.name
+_BUFFER_SIZE = 1024 * 1024
+# Dumps up to this size are built and uploaded without touching the disk.
+_ZIP_SPOOL_MAX_SIZE = 16 * 1024 * 1024
+# Workers only wait on child processes, so allow more of them than there are CPUs.
+_MAX_COMMAND_WORKERS = (os.cpu_count() or 1) * 2
+
+
+def _make_session() -> requests.Session:
+    """
+    Create a session whose keep-alive connections are shared by all requests to the AutoValidator.
+    """
+    session = requests.Session()
+    # Only retry requests that never reached the server; anything else would replay the same Nonce and Signature.
+    retry = Retry(connect=3, read=False, other=0, respect_retry_after_header=False, backoff_factor=0.2)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_SESSION = _make_session()
+
 
 def main(apiver: str | None = None):
-    apiver = apiver or pathlib.Path(__file__).parent.name
+    apiver = apiver or _APIVER
     parser = argparse.ArgumentParser(description=f"BT Auto Dumper CLI {apiver}")
     parser.add_argument("--note", help="Comment or note for the operation", type=str, default="")
     parser.add_argument("--subnet_identifier", help="Subnet Identifier", type=str, default="")
@@ -31,20 +64,17 @@ def main(apiver: str | None = None):
     )
     parser.add_argument("--set-autovalidator-address", help="Set a new autovalidator address", type=str, default="")
     parser.add_argument("--set-codename", help="Set a new Subnet Identifier codename", type=str, default="")
+    parser.add_argument(
+        "--zip-level",
+        help="Deflate compression level of the dump archive",
+        type=int,
+        choices=range(10),
+        default=1,
+    )
 
     args = parser.parse_args()
 
-    # Get configuration directory from env variable.
-    config_base_dir = os.getenv("CONFIG_DIR", default="~/.config/bt-auto-dumper")
-
-    # Check if the CONFIG_DIR environment variable is set
-    if not config_base_dir:
-        raise RuntimeError("CONFIG_DIR environment variable is not set.")
-
-    config_expanded_dir = os.path.expanduser(config_base_dir)
-
-    # Define the full path for the configuration file
-    config_path = os.path.join(config_expanded_dir, "config.ini")
+    config_path = _get_config_path()
 
     # Check if the user wants to update config values
     if args.set_autovalidator_address or args.set_codename:
@@ -53,17 +83,42 @@ def main(apiver: str | None = None):
             new_autovalidator_address=args.set_autovalidator_address,
             new_codename=args.set_codename,
         )
-        logging.info(f"Configuration updated successfully at {config_path}")
+        logger.info("Configuration updated successfully at %s", config_path)
 
     if not (subnet_identifier := args.subnet_identifier) or not (autovalidator_address := args.autovalidator_address):
         autovalidator_address, subnet_identifier, __, __, __ = load_config(config_path=config_path)
     __, __, wallet_name, wallet_hotkey, wallet_path = load_config(config_path=config_path)
     wallet = bt.wallet(name=wallet_name, hotkey=wallet_hotkey, path=wallet_path)
-    dump_and_upload(subnet_identifier, args.chain, wallet, autovalidator_address, args.note)
+    dump_and_upload(subnet_identifier, args.chain, wallet, autovalidator_address, args.note, zip_level=args.zip_level)
+
+
+@functools.cache
+def _get_config_path() -> str:
+    """
+    Resolve the configuration file path from CONFIG_DIR once per process.
+
+    Call `_get_config_path.cache_clear()` to pick up a changed CONFIG_DIR.
+    """
+    # Get configuration directory from env variable.
+    config_base_dir = os.getenv("CONFIG_DIR", default="~/.config/bt-auto-dumper")
+
+    # Check if the CONFIG_DIR environment variable is set
+    if not config_base_dir:
+        raise RuntimeError("CONFIG_DIR environment variable is not set.")
+
+    config_expanded_dir = os.path.expanduser(config_base_dir)
+
+    # Define the full path for the configuration file
+    return os.path.join(config_expanded_dir, "config.ini")
 
 
 def dump_and_upload(
-    subnet_identifier: str, subnet_chain: str, wallet: bt.wallet, autovalidator_address: str, note: str
+    subnet_identifier: str,
+    subnet_chain: str,
+    wallet: bt.wallet,
+    autovalidator_address: str,
+    note: str,
+    zip_level: int = 1,
 ):
     """
     Dump and upload the logs of the commands to the AutoValidator
@@ -73,27 +128,79 @@ def dump_and_upload(
 
     commands = get_commands_from_server(subnet_identifier, subnet_chain, wallet, autovalidator_address)
     if not commands:
-        logging.error(f"Subnet dumper commands of {subnet_identifier} not found.")
+        logger.error("Subnet dumper commands of %s not found.", subnet_identifier)
         return
-    logging.info(f"Subnet dumper commands of {subnet_identifier} retrieved successfully. {commands}")
-    output_files = []
-    for i, command in enumerate(commands, start=1):
-        output_file = f"{subnet_identifier}_{i}.txt"
-        with open(output_file, "w") as f:
-            f.write(f"Command: {command}\n")
-            result = subprocess.run(command, shell=True, capture_output=True, text=True)
-            f.write(result.stdout)
-        output_files.append(output_file)
-
+    logger.info("Subnet dumper commands of %s retrieved successfully. %s", subnet_identifier, commands)
     zip_filename = f"{subnet_identifier}-output.zip"
-    with zipfile.ZipFile(zip_filename, "w") as zipf:
-        for file in output_files:
-            zipf.write(file)
-    send_to_autovalidator(zip_filename, wallet, autovalidator_address, note, subnet_identifier, subnet_chain)
+    jobs = [(f"{subnet_identifier}_{i}.txt", command) for i, command in enumerate(commands, start=1)]
+    # Commands are independent of each other, so run them concurrently and archive each output once it is ready.
+    with (
+        tempfile.SpooledTemporaryFile(max_size=_ZIP_SPOOL_MAX_SIZE, mode="w+b", buffering=_BUFFER_SIZE) as zip_file,
+        ThreadPoolExecutor(max_workers=min(_MAX_COMMAND_WORKERS, len(jobs))) as executor,
+    ):
+        futures = {executor.submit(_run_command, command): entry_name for entry_name, command in jobs}
+        try:
+            with zipfile.ZipFile(zip_file, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=zip_level) as zipf:
+                for future in as_completed(futures):
+                    with future.result() as output:
+                        entry_size = os.fstat(output.fileno()).st_size
+                        # The entry size is known upfront, so ZIP64 records are only needed for huge outputs,
+                        # using the same compression headroom zipfile itself applies.
+                        with zipf.open(
+                            futures[future], "w", force_zip64=entry_size * 1.05 > zipfile.ZIP64_LIMIT
+                        ) as entry:
+                            shutil.copyfileobj(output, entry, length=_BUFFER_SIZE)
+        finally:
+            # After an error, skip the remaining commands, and close the outputs that were not archived;
+            # they would otherwise hold their descriptors until collected.
+            _close_outputs(futures)
+        zip_file.seek(0)
+        send_to_autovalidator(
+            (zip_filename, zip_file), wallet, autovalidator_address, note, subnet_identifier, subnet_chain
+        )
+
+
+def _run_command(command: str) -> IO[bytes]:
+    """
+    Run a shell command and return its output spooled to an anonymous temporary file.
+
+    The child writes straight to the file descriptor, so the output never passes through Python.
+    """
+    output = tempfile.TemporaryFile(buffering=_BUFFER_SIZE)
+    try:
+        output.write(f"Command: {command}\n".encode())
+        # The child shares the descriptor, so the header must reach it before the command's output does.
+        output.flush()
+        subprocess.run(command, shell=True, stdout=output, stderr=subprocess.STDOUT)
+        output.seek(0)
+    except BaseException:
+        output.close()
+        raise
+    return output
+
+
+def _close_outputs(futures: Collection[Future[IO[bytes]]]):
+    """
+    Cancel the commands that have not started yet and close the outputs of those that finished successfully.
+
+    Waits for the commands that are already running, since their outputs can only be closed once they are done.
+    """
+    # Cancel everything first, so waiting on a running command does not let the queued ones start.
+    for future in futures:
+        future.cancel()
+    for future in futures:
+        if not future.cancelled() and future.exception() is None:
+            future.result().close()
 
 
 def make_signed_request(
-    method: str, url: str, headers: dict, file_path: str, wallet: bt.wallet, subnet_chain: str
+    method: str,
+    url: str,
+    headers: dict,
+    file: tuple[str, IO[bytes]] | None,
+    wallet: bt.wallet,
+    subnet_chain: str,
+    session: requests.Session = _SESSION,
 ) -> requests.Response:
     """
     Example:
@@ -101,37 +208,89 @@ def make_signed_request(
             "POST",
             "http://localhost:8000/api/v1/files/",
             {"Note": "Test"},
-            "/path/test.zip",
+            ("test.zip", zip_file),
             wallet,
             "mainnet",
         )
 
     """
-    headers["Nonce"] = str(time.time())
-    headers["Hotkey"] = wallet.hotkey.ss58_address
     headers["Realm"] = subnet_chain
-    file_content = b""
-    files = None
-    if file_path:
-        files = {"file": open(file_path, "rb")}
-        file = files.get("file")
-
-        if isinstance(file, BufferedReader):
-            file_content = file.read()
-            file.seek(0)
+    file_digest = ""
+    if file:
+        # Sign a digest of the file instead of its full contents.
+        file_digest = _sha256_hexdigest(file[1])
+        headers["Content-SHA256"] = file_digest
+    _sign_headers(method, url, headers, file_digest, wallet)
+    return _send_signed_request(session, method, url, headers, file)
+
+
+def _sign_headers(method: str, url: str, headers: dict, file_digest: str, wallet: bt.wallet):
+    """
+    Add a fresh Nonce, the Hotkey and the Signature to the headers of a request.
+
+    The body is covered by its precomputed digest, so re-signing a request, e.g. on retry, does not read the file again.
+    """
+    headers["Nonce"] = str(time.time_ns())
+    # Resolve the hotkey once; the wallet loads its keypair lazily behind this property.
+    hotkey = wallet.hotkey
+    headers["Hotkey"] = hotkey.ss58_address
     headers_str = json.dumps(headers, sort_keys=True)
-    data_to_sign = f"{method}{url}{headers_str}{file_content.decode(errors='ignore')}".encode()
-    signature = wallet.hotkey.sign(
+    data_to_sign = b"|".join((method.encode(), url.encode(), headers_str.encode(), file_digest.encode()))
+    signature = hotkey.sign(
         data_to_sign,
     ).hex()
     headers["Signature"] = signature
 
-    response = requests.request(method, url, headers=headers, files=files)
+
+def _send_signed_request(
+    session: requests.Session, method: str, url: str, headers: dict, file: tuple[str, IO[bytes]] | None
+) -> requests.Response:
+    """
+    Send a request signed by `_sign_headers`, streaming the file, if any, from its start as a multipart body.
+    """
+    data = None
+    if file:
+        file_name, file_obj = file
+        # Stream the multipart body from the file instead of building it in memory.
+        data = MultipartEncoder({"file": (file_name, _SizedReader(file_obj), "application/zip")})
+        headers = {**headers, "Content-Type": data.content_type}
+    response = session.request(method, url, headers=headers, data=data)
     return response
 
 
+def _sha256_hexdigest(file: IO[bytes]) -> str:
+    """
+    Compute the SHA-256 hex digest of a file object from its start, leaving it rewound.
+    """
+    file.seek(0)
+    # typeshed's IO lacks `readinto`, which both spooled and on-disk temporary files provide.
+    digest = hashlib.file_digest(file, "sha256")  # type: ignore[arg-type]
+    file.seek(0)
+    return digest.hexdigest()
+
+
+class _SizedReader:
+    """
+    Readable view of a seekable file object exposing the remaining length as `len`.
+
+    MultipartEncoder otherwise sizes file objects via `fileno()`, which would roll a `SpooledTemporaryFile` to disk.
+    """
+
+    def __init__(self, file: IO[bytes]):
+        self._file = file
+        self._size = file.seek(0, os.SEEK_END)
+        file.seek(0)
+
+    @property
+    def len(self) -> int:
+        return self._size - self._file.tell()
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+
 def send_to_autovalidator(
-    zip_filename: str,
+    zip_file: tuple[str, IO[bytes]],
     wallet: bt.wallet,
     autovalidator_address: str,
     note: str,
@@ -140,7 +299,9 @@ def send_to_autovalidator(
 ):
     """
     Example:
-        >>> send_to_autovalidator("test.zip", wallet, "http://localhost:8000", "Test", "computehorde", "mainnet")
+        >>> send_to_autovalidator(
+            ("test.zip", zip_file), wallet, "http://localhost:8000", "Test", "computehorde", "mainnet"
+        )
 
     """
     url = f"{autovalidator_address}/api/v1/files/"
@@ -149,14 +310,15 @@ def send_to_autovalidator(
         "Note": note,
         "SubnetID": subnet_identifier,
     }
-    response = make_signed_request("POST", url, headers, zip_filename, wallet, subnet_chain)
+    response = make_signed_request("POST", url, headers, zip_file, wallet, subnet_chain)
     if response.status_code == 201:
-        logging.info("File successfully uploaded and resource created.")
+        logger.info("File successfully uploaded and resource created.")
     elif response.status_code == 200:
-        logging.warning("Request succeeded.")
+        logger.warning("Request succeeded.")
     else:
-        logging.error(f"Failed to upload file. Status code: {response.status_code}")
-        logging.error(response.text)
+        logger.error("Failed to upload file. Status code: %s", response.status_code)
+        if logger.isEnabledFor(logging.ERROR):
+            logger.error("%s", response.text)
 
 
 def load_config(config_path: str) -> tuple[str, str, str, str, str]:
@@ -175,6 +337,12 @@ def load_config(config_path: str) -> tuple[str, str, str, str, str]:
     if not os.path.exists(config_path):
         raise FileNotFoundError(f"{config_path} does not exist.")
 
+    # Serve unchanged configuration from memory; a modified file gets a new mtime and is parsed again.
+    return _load_config_cached(config_path, os.stat(config_path).st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=8)
+def _load_config_cached(config_path: str, mtime_ns: int) -> tuple[str, str, str, str, str]:
     # Read the configuration file
     config = configparser.ConfigParser()
     try:
@@ -258,13 +426,14 @@ def get_commands_from_server(
         "Note": "",
         "SubnetID": subnet_identifier,
     }
-    response = make_signed_request("GET", url, headers, "", wallet, subnet_chain)
+    response = make_signed_request("GET", url, headers, None, wallet, subnet_chain)
     if response.status_code == 200:
         data = response.json()
         return data
     else:
-        logging.error(f"Failed to get commands. Status code: {response.status_code}")
-        logging.error(response.text)
+        logger.error("Failed to get commands. Status code: %s", response.status_code)
+        if logger.isEnabledFor(logging.ERROR):
+            logger.error("%s", response.text)
         return []
 
 
@@ -0,0 +1,306 @@
+import hashlib
+import io
+import os
+import tempfile
+import zipfile
+from unittest import mock
+
+import pytest
+import requests
+from freezegun import freeze_time
+from requests_toolbelt.multipart.decoder import MultipartDecoder  # type: ignore
+
+from bt_auto_dumper._v2 import __main__ as dumper
+
+FROZEN_TIME = "2024-01-01T00:00:00Z"
+FROZEN_NONCE = "1704067200000000000"
+
+
+class StubHotkey:
+    ss58_address = "5StubHotkey"
+
+    def __init__(self):
+        self.signed: list[bytes] = []
+
+    def sign(self, data: bytes) -> bytes:
+        self.signed.append(data)
+        return b"\x01\x02"
+
+
+class StubWallet:
+    def __init__(self):
+        self.hotkey = StubHotkey()
+
+
+@pytest.fixture
+def wallet():
+    return StubWallet()
+
+
+@pytest.fixture
+def session():
+    return mock.Mock(spec=requests.Session)
+
+
+def read_file_part(request_kwargs: dict) -> bytes:
+    encoder = request_kwargs["data"]
+    (part,) = MultipartDecoder(encoder.read(), request_kwargs["headers"]["Content-Type"]).parts
+    return part.content
+
+
+@pytest.fixture
+def config_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("CONFIG_DIR", str(tmp_path))
+    dumper._get_config_path.cache_clear()
+    yield tmp_path
+    dumper._get_config_path.cache_clear()
+
+
+class FakeAutoValidator:
+    """
+    Stands in for the shared session, serving `commands` and recording uploaded dumps.
+    """
+
+    def __init__(self, commands: list[str]):
+        self.commands = commands
+        self.uploads: list[tuple[str, dict, bytes]] = []
+
+    def request(self, method, url, headers, data):
+        if method == "GET":
+            return mock.Mock(status_code=200, json=mock.Mock(return_value=self.commands))
+        # The dump is only open for the duration of the upload, so consume it here.
+        self.uploads.append((url, headers, read_file_part({"data": data, "headers": headers})))
+        return mock.Mock(status_code=201)
+
+    def archived_entries(self) -> dict[str, bytes]:
+        ((_, _, archive),) = self.uploads
+        with zipfile.ZipFile(io.BytesIO(archive)) as zipf:
+            return {name: zipf.read(name) for name in zipf.namelist()}
+
+
+@pytest.fixture
+def autovalidator(monkeypatch):
+    def serve(commands: list[str]) -> FakeAutoValidator:
+        fake = FakeAutoValidator(commands)
+        monkeypatch.setattr(dumper._SESSION, "request", fake.request)
+        return fake
+
+    return serve
+
+
+def test_load_config__reparses_after_mtime_change(tmp_path):
+    config_path = str(tmp_path / "config.ini")
+    dumper.update_confg(config_path, "http://localhost:8000", "computehorde")
+    os.utime(config_path, ns=(1_000_000_000, 1_000_000_000))
+    assert dumper.load_config(config_path)[:2] == ("http://localhost:8000", "computehorde")
+
+    dumper.update_confg(config_path, "http://localhost:9000", "")
+    os.utime(config_path, ns=(2_000_000_000, 2_000_000_000))
+    assert dumper.load_config(config_path)[:2] == ("http://localhost:9000", "computehorde")
+
+    # Unchanged mtime is served from the cache without reading the file again.
+    dumper.update_confg(config_path, "http://localhost:7000", "")
+    os.utime(config_path, ns=(2_000_000_000, 2_000_000_000))
+    assert dumper.load_config(config_path)[:2] == ("http://localhost:9000", "computehorde")
+
+
+@freeze_time(FROZEN_TIME)
+def test_make_signed_request__get_signs_empty_digest(wallet, session):
+    url = "http://localhost:8000/api/v1/commands/"
+
+    dumper.make_signed_request(
+        "GET", url, {"Note": "", "SubnetID": "computehorde"}, None, wallet, "mainnet", session=session
+    )
+
+    assert wallet.hotkey.signed == [
+        (
+            f"GET|{url}|"
+            f'{{"Hotkey": "5StubHotkey", "Nonce": "{FROZEN_NONCE}", "Note": "", '
+            '"Realm": "mainnet", "SubnetID": "computehorde"}|'
+        ).encode()
+    ]
+    session.request.assert_called_once()
+    _, kwargs = session.request.call_args
+    assert kwargs["data"] is None
+    assert kwargs["headers"]["Signature"] == "0102"
+    assert "Content-SHA256" not in kwargs["headers"]
+
+
+@freeze_time(FROZEN_TIME)
+def test_make_signed_request__post_signs_file_digest(wallet, session):
+    url = "http://localhost:8000/api/v1/files/"
+    content = b"PK\x03\x04 not really a zip \x00\xff"
+    digest = hashlib.sha256(content).hexdigest()
+
+    dumper.make_signed_request(
+        "POST",
+        url,
+        {"Note": 'quoted "note"', "SubnetID": "computehorde"},
+        ("test.zip", io.BytesIO(content)),
+        wallet,
+        "mainnet",
+        session=session,
+    )
+
+    assert wallet.hotkey.signed == [
+        (
+            f"POST|{url}|"
+            f'{{"Content-SHA256": "{digest}", "Hotkey": "5StubHotkey", "Nonce": "{FROZEN_NONCE}", '
+            '"Note": "quoted \\"note\\"", "Realm": "mainnet", "SubnetID": "computehorde"}'
+            f"|{digest}"
+        ).encode()
+    ]
+
+
+def test_session__retries_connect_errors_only():
+    retry = dumper._SESSION.get_adapter("https://localhost").max_retries
+
+    assert retry.connect == 3
+    assert retry.read is False
+    assert retry.other == 0
+    assert not retry.respect_retry_after_header
+
+
+def test_run_command__closes_output_when_command_cannot_start(monkeypatch):
+    outputs = []
+    temporary_file = tempfile.TemporaryFile
+
+    def record_temporary_file(*args, **kwargs):
+        outputs.append(temporary_file(*args, **kwargs))
+        return outputs[-1]
+
+    monkeypatch.setattr(dumper.tempfile, "TemporaryFile", record_temporary_file)
+    monkeypatch.setattr(dumper.subprocess, "run", mock.Mock(side_effect=OSError("fork failed")))
+
+    with pytest.raises(OSError, match="fork failed"):
+        dumper._run_command("echo hello")
+
+    (output,) = outputs
+    assert output.closed
+
+
+def test_dump_and_upload__closes_outputs_and_skips_queued_commands_on_archive_error(wallet, autovalidator, monkeypatch):
+    fake = autovalidator(["echo first", "sleep 0.5", "echo queued"])
+    ran, outputs = [], []
+    run_command = dumper._run_command
+
+    def record_run_command(command):
+        ran.append(command)
+        outputs.append(run_command(command))
+        return outputs[-1]
+
+    monkeypatch.setattr(dumper, "_MAX_COMMAND_WORKERS", 1)
+    monkeypatch.setattr(dumper, "_run_command", record_run_command)
+    monkeypatch.setattr(dumper.shutil, "copyfileobj", mock.Mock(side_effect=OSError("disk full")))
+
+    with pytest.raises(OSError, match="disk full"):
+        dumper.dump_and_upload("sn", "mainnet", wallet, "http://localhost:8000", "note")
+
+    assert ran == ["echo first", "sleep 0.5"]
+    assert all(output.closed for output in outputs)
+    assert not fake.uploads
+
+
+def test_make_signed_request__streams_spooled_file_matching_content_sha256(wallet, session):
+    content = bytes(range(256)) * 4096
+    with tempfile.SpooledTemporaryFile(max_size=2 * len(content)) as file:
+        file.write(content)
+
+        dumper.make_signed_request(
+            "POST", "http://localhost:8000/api/v1/files/", {}, ("test.zip", file), wallet, "mainnet", session=session
+        )
+
+        _, kwargs = session.request.call_args
+        streamed = read_file_part(kwargs)
+        # Sizing the multipart body must not roll the in-memory dump over to disk.
+        assert not file._rolled
+
+    assert streamed == content
+    assert kwargs["headers"]["Content-SHA256"] == hashlib.sha256(streamed).hexdigest()
+
+
+def test_main__set_flags_update_config_then_dump(config_dir, monkeypatch):
+    config_path = str(config_dir / "config.ini")
+    dumper.update_confg(config_path, "http://localhost:8000", "computehorde")
+
+    def build_wallet(name, hotkey, path):
+        # The wallet is only built once the configuration has been updated.
+        assert dumper.load_config(config_path)[:2] == ("http://localhost:9000", "computehorde")
+        return StubWallet()
+
+    dump_and_upload = mock.Mock()
+    monkeypatch.setattr(dumper.bt, "wallet", build_wallet)
+    monkeypatch.setattr(dumper, "dump_and_upload", dump_and_upload)
+    monkeypatch.setattr("sys.argv", ["bt-auto-dumper", "--set-autovalidator-address", "http://localhost:9000"])
+
+    dumper.main()
+
+    dump_and_upload.assert_called_once()
+    subnet_identifier, chain, wallet, autovalidator_address, note = dump_and_upload.call_args.args
+    assert (subnet_identifier, chain, autovalidator_address) == ("computehorde", "mainnet", "http://localhost:9000")
+    assert isinstance(wallet, StubWallet)
+
+
+def test_dump_and_upload__archives_each_output_under_its_command_index(wallet, autovalidator):
+    fake = autovalidator(["echo hello", "printf 'a\\nb\\n'", "true"])
+
+    dumper.dump_and_upload("sn", "mainnet", wallet, "http://localhost:8000", "note")
+
+    ((url, headers, _),) = fake.uploads
+    assert url == "http://localhost:8000/api/v1/files/"
+    assert (headers["SubnetID"], headers["Note"]) == ("sn", "note")
+    assert fake.archived_entries() == {
+        "sn_1.txt": b"Command: echo hello\nhello\n",
+        "sn_2.txt": b"Command: printf 'a\\nb\\n'\na\nb\n",
+        "sn_3.txt": b"Command: true\n",
+    }
+
+
+def test_dump_and_upload__zip64_only_for_entries_near_the_limit(wallet, autovalidator, monkeypatch):
+    fake = autovalidator(["printf %0100d 0", "printf %0400d 0"])
+    force_zip64s = {}
+    zipfile_open = zipfile.ZipFile.open
+
+    def record_open(self, name, mode="r", pwd=None, *, force_zip64=False):
+        force_zip64s[name] = force_zip64
+        return zipfile_open(self, name, mode, pwd, force_zip64=force_zip64)
+
+    # Shrink the limit so that only the second, ~400 byte output crosses it with the 5% headroom.
+    monkeypatch.setattr(zipfile, "ZIP64_LIMIT", 300)
+    monkeypatch.setattr(zipfile.ZipFile, "open", record_open)
+
+    dumper.dump_and_upload("sn", "mainnet", wallet, "http://localhost:8000", "note")
+
+    assert force_zip64s == {"sn_1.txt": False, "sn_2.txt": True}
+    assert fake.archived_entries()["sn_2.txt"] == b"Command: printf %0400d 0\n" + b"0" * 400
+
+
+def test_main__zip_level_reaches_zipfile(config_dir, autovalidator, monkeypatch):
+    dumper.update_confg(str(config_dir / "config.ini"), "http://localhost:8000", "computehorde")
+    fake = autovalidator(["echo hello"])
+    compresslevels = []
+    zipfile_init = zipfile.ZipFile.__init__
+
+    def record_init(self, file, mode="r", *args, **kwargs):
+        if mode == "w":
+            compresslevels.append(kwargs.get("compresslevel"))
+        zipfile_init(self, file, mode, *args, **kwargs)
+
+    monkeypatch.setattr(dumper.bt, "wallet", lambda name, hotkey, path: StubWallet())
+    monkeypatch.setattr(zipfile.ZipFile, "__init__", record_init)
+    monkeypatch.setattr("sys.argv", ["bt-auto-dumper", "--zip-level", "9"])
+
+    dumper.main()
+
+    assert compresslevels == [9]
+    assert fake.archived_entries() == {"computehorde_1.txt": b"Command: echo hello\nhello\n"}
+
+
+def test_dump_and_upload__merges_stderr_after_the_command_header(wallet, autovalidator):
+    fake = autovalidator(["echo out; echo err >&2; echo out again"])
+
+    dumper.dump_and_upload("sn", "mainnet", wallet, "http://localhost:8000", "note")
+
+    assert fake.archived_entries() == {
+        "sn_1.txt": b"Command: echo out; echo err >&2; echo out again\nout\nerr\nout again\n",
+    }